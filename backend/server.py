@@ -1,16 +1,35 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, CollectionInvalid, DuplicateKeyError
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional
+from typing import Dict, List, Optional
 import uuid
 from datetime import datetime, timedelta
 import requests
 import asyncio
+import math
+from abc import ABC, abstractmethod
+import time
+import gzip
+import hashlib
+import json
+from collections import Counter, OrderedDict, deque
+import sys
+from urllib.parse import parse_qs
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
 
 
 ROOT_DIR = Path(__file__).parent
@@ -28,6 +47,33 @@ app = FastAPI(title="VaultLinks API", description="Google Drive Link Management"
 api_router = APIRouter(prefix="/api")
 
 
+MAX_TAGS_PER_LINK = 20
+MAX_TAG_LENGTH = 50
+MAX_FOLDER_LENGTH = 100
+
+def normalize_tag(tag: str) -> str:
+    return tag.strip().lower()
+
+def clean_tags(tags: List[str]) -> List[str]:
+    cleaned = []
+    for tag in tags:
+        tag = normalize_tag(tag)
+        if len(tag) > MAX_TAG_LENGTH:
+            raise ValueError(f'Tags can be at most {MAX_TAG_LENGTH} characters')
+        if tag and tag not in cleaned:
+            cleaned.append(tag)
+    if len(cleaned) > MAX_TAGS_PER_LINK:
+        raise ValueError(f'A link can have at most {MAX_TAGS_PER_LINK} tags')
+    return cleaned
+
+def clean_folder(folder: Optional[str]) -> Optional[str]:
+    if folder is None:
+        return None
+    folder = folder.strip()
+    if len(folder) > MAX_FOLDER_LENGTH:
+        raise ValueError(f'Folder names can be at most {MAX_FOLDER_LENGTH} characters')
+    return folder or None
+
 # Define Models
 class User(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -49,7 +95,11 @@ class VaultLink(BaseModel):
     url: str
     name: str
     access_level: str = "Restricted"
+    tags: List[str] = Field(default_factory=list)
+    folder: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_accessed_at: Optional[datetime] = None
+    archived_at: Optional[datetime] = None
     
     @validator('url')
     def validate_url(cls, v):
@@ -68,12 +118,408 @@ class VaultLinkCreate(BaseModel):
     url: str
     name: str
     access_level: str = "Restricted"
+    tags: List[str] = Field(default_factory=list)
+    folder: Optional[str] = None
+    
+    @validator('tags')
+    def validate_tags(cls, v):
+        return clean_tags(v)
+    
+    @validator('folder')
+    def validate_folder(cls, v):
+        return clean_folder(v)
+
+class VaultLinkUpdate(BaseModel):
+    """Fields a saved link can change; omitted fields are left alone, an empty folder clears it"""
+    tags: Optional[List[str]] = None
+    folder: Optional[str] = None
+    
+    @validator('tags')
+    def validate_tags(cls, v):
+        return None if v is None else clean_tags(v)
+    
+    @validator('folder')
+    def validate_folder(cls, v):
+        return clean_folder(v)
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
+class ActivityDay(BaseModel):
+    date: str
+    created: int = 0
+    deleted: int = 0
+    archived: int = 0
+    restored: int = 0
+
+class VaultStats(BaseModel):
+    total: int = 0
+    archived: int = 0
+    by_access_level: Dict[str, int] = Field(default_factory=dict)
+    recent_activity: List[ActivityDay] = Field(default_factory=list)
+    last_created_at: Optional[datetime] = None
+    last_deleted_at: Optional[datetime] = None
 
 class AuthRequest(BaseModel):
     session_id: str
 
-# Authentication helper
-async def get_current_user(session_token: Optional[str] = None):
+# Response compression
+COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", 500))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", 5))
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q=0"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            accepted[coding.lower()] = quality
+
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = None
+    for coding in candidates:
+        quality = accepted.get(coding, accepted.get("*", 0.0))
+        if quality > 0 and (best is None or quality > best[1]):
+            best = (coding, quality)
+    return best[0] if best else None
+
+def compress_body(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+class CachedPayload:
+    """A serialized response body plus the compressed variants produced for it so far"""
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.created = time.monotonic()
+        self.encoded = {}
+
+    def encode(self, encoding: Optional[str]):
+        if encoding is None or len(self.body) < COMPRESSION_MIN_SIZE:
+            return None, self.body
+        if encoding not in self.encoded:
+            self.encoded[encoding] = compress_body(self.body, encoding)
+        return encoding, self.encoded[encoding]
+
+class PayloadCache:
+    """Small per-process LRU of serialized list payloads, invalidated on writes.
+
+    The LRU holds (key, variant) pairs, so max_entries bounds every cached view;
+    a per-key index lets one write (key = user id) drop all of that user's
+    variants (e.g. filtered views).
+
+    Readers take generation(key) before querying and pass it to put(); a write
+    that invalidated the key in between bumps the generation, so the stale
+    snapshot is served once but never cached.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 1000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._variants = {}
+        self._invalidations = OrderedDict()
+        self._clock = 0
+        # Generation assumed for keys whose invalidation record was evicted
+        self._floor = 0
+
+    def generation(self, key: str) -> int:
+        return self._invalidations.get(key, self._floor)
+
+    def get(self, key: str, variant=None) -> Optional[CachedPayload]:
+        entry = self._entries.get((key, variant))
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created > self.ttl:
+            self._discard(key, variant)
+            return None
+        self._entries.move_to_end((key, variant))
+        return entry
+
+    def _discard(self, key: str, variant):
+        self._entries.pop((key, variant), None)
+        variants = self._variants.get(key)
+        if variants is not None:
+            variants.discard(variant)
+            if not variants:
+                del self._variants[key]
+
+    def put(self, key: str, body: bytes, variant=None, generation: Optional[int] = None) -> CachedPayload:
+        entry = CachedPayload(body)
+        if generation is not None and generation != self.generation(key):
+            return entry
+        self._entries[(key, variant)] = entry
+        self._entries.move_to_end((key, variant))
+        self._variants.setdefault(key, set()).add(variant)
+        while len(self._entries) > self.max_entries:
+            evicted_key, evicted_variant = next(iter(self._entries))
+            self._discard(evicted_key, evicted_variant)
+        return entry
+
+    def invalidate(self, key: str):
+        for variant in self._variants.pop(key, ()):
+            self._entries.pop((key, variant), None)
+        self._clock += 1
+        self._invalidations[key] = self._clock
+        self._invalidations.move_to_end(key)
+        if len(self._invalidations) > self.max_entries:
+            _, evicted = self._invalidations.popitem(last=False)
+            self._floor = max(self._floor, evicted)
+
+    def clear(self):
+        """Invalidate every key, including snapshots readers are still building"""
+        self._entries.clear()
+        self._variants.clear()
+        self._invalidations.clear()
+        self._clock += 1
+        self._floor = self._clock
+
+vault_link_list_cache = PayloadCache(ttl=float(os.environ.get("LIST_CACHE_TTL", 30.0)))
+
+def payload_response(request: Request, payload: CachedPayload) -> Response:
+    """Build a JSON response from a cached payload, reusing its compressed bytes"""
+    encoding, body = payload.encode(negotiate_encoding(request.headers.get("accept-encoding")))
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Idempotency keys
+IDEMPOTENCY_KEY_TTL = timedelta(hours=int(os.environ.get("IDEMPOTENCY_KEY_TTL_HOURS", 24)))
+IDEMPOTENCY_CLAIM_LEASE = timedelta(seconds=int(os.environ.get("IDEMPOTENCY_CLAIM_LEASE_SECONDS", 30)))
+
+class RequestCoalescer:
+    """Runs one coroutine per key at a time; concurrent callers with the same key share its result"""
+
+    def __init__(self):
+        self._inflight = {}
+
+    async def run(self, key, coro_factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every waiter went away
+
+link_creation_coalescer = RequestCoalescer()
+
+def request_fingerprint(link_data: BaseModel) -> str:
+    return hashlib.sha256(json.dumps(link_data.dict(), sort_keys=True).encode()).hexdigest()
+
+# Live updates
+SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+
+class Subscription:
+    def __init__(self, user_id: str, buffer_size: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+
+class EventBroker:
+    """In-process fan-out of per-user vault events with a short replay history for resuming streams.
+
+    Every dispatched event gets a local sequence number. Besides real event ids,
+    streams are handed position markers ("<epoch>@<sequence>") so a client that
+    has seen no events, or was told to resync, still resumes without a refetch
+    as long as nothing it needs has been trimmed from the history.
+    """
+
+    def __init__(self, buffer_size: int = 100, history_size: int = 200, max_users: int = 10000):
+        self.buffer_size = buffer_size
+        self.history_size = history_size
+        self.max_users = max_users
+        self._subscribers = {}
+        self._history = OrderedDict()
+        # Sequence of the newest event dropped from each user's history
+        self._trimmed = {}
+        # Newest sequence among users evicted from the history altogether
+        self._evicted_floor = 0
+        self._epoch = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        # Called as listener(user_id, event) for every dispatched event, in every worker;
+        # user_id is None when events may have been missed for every user
+        self.listeners = []
+
+    def position(self) -> str:
+        return f"{self._epoch}@{self._sequence}"
+
+    def _marker_sequence(self, event_id: str) -> Optional[int]:
+        epoch, _, sequence = event_id.partition("@")
+        if epoch != self._epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, user_id: str, event_type: str, data: dict):
+        self.dispatch(user_id, event_type, data)
+
+    def dispatch(self, user_id: str, event_type: str, data: dict, event_id: Optional[str] = None):
+        self._sequence += 1
+        if event_id is None:
+            event_id = f"{self._epoch}-{self._sequence}"
+        event = {"id": event_id, "event": event_type, "data": data, "sequence": self._sequence}
+        for listener in self.listeners:
+            listener(user_id, event)
+
+        history = self._history.pop(user_id, None) or deque(maxlen=self.history_size)
+        if len(history) == history.maxlen:
+            self._trimmed[user_id] = history[0]["sequence"]
+        history.append(event)
+        self._history[user_id] = history
+        if len(self._history) > self.max_users:
+            evicted_user, evicted = self._history.popitem(last=False)
+            self._trimmed.pop(evicted_user, None)
+            self._evicted_floor = max(self._evicted_floor, evicted[-1]["sequence"])
+
+        for subscription in list(self._subscribers.get(user_id, ())):
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.drop(subscription)
+
+    def subscribe(self, user_id: str, last_event_id: Optional[str] = None):
+        """Register a subscriber; returns it with the events it missed since last_event_id"""
+        subscription = Subscription(user_id, self.buffer_size)
+        self._subscribers.setdefault(user_id, set()).add(subscription)
+
+        replay = []
+        if last_event_id:
+            history = list(self._history.get(user_id, ()))
+            ids = [event["id"] for event in history]
+            seen = self._marker_sequence(last_event_id)
+            floor = self._trimmed.get(user_id, 0) if user_id in self._history else self._evicted_floor
+            if last_event_id in ids:
+                replay = history[ids.index(last_event_id) + 1:]
+            elif seen is not None and seen >= floor:
+                replay = [event for event in history if event["sequence"] > seen]
+            else:
+                # Too old, or issued by another worker: the client has to refetch the list. The
+                # current position becomes its last event id so the next reconnect can resume.
+                replay = [{"id": self.position(), "event": "resync", "data": {}}]
+        return subscription, replay
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def resync_all(self):
+        """Tell every subscriber to refetch after events were missed, and stop resuming
+        from anything issued before now"""
+        self._sequence += 1
+        self._history.clear()
+        self._trimmed.clear()
+        self._evicted_floor = self._sequence
+        event = {"id": self.position(), "event": "resync", "data": {}}
+        for listener in self.listeners:
+            listener(None, event)
+        for subscribers in list(self._subscribers.values()):
+            for subscription in list(subscribers):
+                try:
+                    subscription.queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    self.drop(subscription)
+
+    def drop(self, subscription: Subscription):
+        """Disconnect a consumer whose buffer is full; it can reconnect with Last-Event-ID"""
+        self.unsubscribe(subscription)
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+
+class ChangeStreamEventBroker(EventBroker):
+    """Publishes through db.vault_events and fans out from its change stream, so every worker
+    sees every event. Requires MongoDB running as a replica set."""
+
+    def __init__(self, collection, **kwargs):
+        super().__init__(**kwargs)
+        self.collection = collection
+        self._watcher = None
+
+    async def start(self):
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._watcher:
+            self._watcher.cancel()
+
+    async def publish(self, user_id: str, event_type: str, data: dict):
+        try:
+            await self.collection.insert_one({
+                "user_id": user_id,
+                "event": event_type,
+                "data": data,
+                "created_at": datetime.utcnow()
+            })
+        except Exception:
+            logger.exception("Failed to publish vault event")
+
+    async def _watch(self):
+        resume_token = None
+        while True:
+            opened = False
+            try:
+                async with self.collection.watch(
+                    [{"$match": {"operationType": "insert"}}], resume_after=resume_token
+                ) as stream:
+                    opened = True
+                    async for change in stream:
+                        doc = change["fullDocument"]
+                        self.dispatch(doc["user_id"], doc["event"], doc["data"], event_id=str(doc["_id"]))
+                        resume_token = stream.resume_token
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                if resume_token is not None and not opened:
+                    # The token fell out of the oplog (or is otherwise unusable): start from
+                    # now and have every stream refetch what it missed
+                    logger.exception("Could not resume vault event change stream; resyncing")
+                    resume_token = None
+                    self.resync_all()
+                else:
+                    logger.exception("Vault event change stream failed; reconnecting")
+                await asyncio.sleep(1)
+
+if os.environ.get("VAULT_EVENTS_BROKER", "local") == "change_stream":
+    vault_events = ChangeStreamEventBroker(db.vault_events)
+else:
+    vault_events = EventBroker()
+
+# Writes invalidate locally; the fan-out also reaches workers (and the archive job) that
+# did not make the write when the change-stream broker is on
+vault_events.listeners.append(
+    lambda user_id, event: vault_link_list_cache.invalidate(user_id) if user_id else vault_link_list_cache.clear()
+)
+
+def format_sse(event: dict) -> str:
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+# Authentication helpers
+async def get_current_session(session_token: Optional[str] = None):
+    """Return the (session, user) pair for a valid session token"""
     if not session_token:
         raise HTTPException(status_code=401, detail="Session token required")
     
@@ -91,7 +537,11 @@ async def get_current_user(session_token: Optional[str] = None):
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
     
-    return User(**user)
+    return session, User(**user)
+
+async def get_current_user(session_token: Optional[str] = None):
+    _, user = await get_current_session(session_token)
+    return user
 
 # Authentication endpoints
 @api_router.post("/auth/profile")
@@ -147,29 +597,518 @@ async def get_current_user_info(session_token: str):
     user = await get_current_user(session_token)
     return user
 
-# VaultLink endpoints
-@api_router.post("/vault-links", response_model=VaultLink)
-async def create_vault_link(link_data: VaultLinkCreate, session_token: str):
-    """Create a new vault link"""
-    user = await get_current_user(session_token)
-    
+# VaultLink persistence
+async def adjust_tag_counts(user_id: str, tags: List[str], delta: int):
+    """Keep db.tag_counts in step with link writes instead of aggregating on read"""
+    if not tags:
+        return
+    await db.tag_counts.bulk_write([
+        UpdateOne({"user_id": user_id, "tag": tag}, {"$inc": {"count": delta * n}}, upsert=True)
+        for tag, n in Counter(tags).items()
+    ], ordered=False)
+    if delta < 0:
+        await db.tag_counts.delete_many({"user_id": user_id, "tag": {"$in": tags}, "count": {"$lte": 0}})
+
+VAULT_STATS_WRITE_LEASE = timedelta(seconds=int(os.environ.get("VAULT_STATS_WRITE_LEASE_SECONDS", 60)))
+
+async def begin_link_writes(user_ids: List[str]):
+    """Flag writes to the users' links as in flight, before they touch vault_links or the archive.
+
+    Bumps version, so a rebuild that read the summary earlier fails its guard, and
+    pending_writes, so a rebuild that reads it now waits instead of counting a
+    link whose own $inc is still to come. Every call is matched by
+    adjust_vault_stats (through record_link_changes) or end_link_writes.
+    """
+    await db.vault_stats.update_many(
+        {"user_id": {"$in": user_ids}},
+        {"$inc": {"version": 1, "pending_writes": 1}, "$set": {"pending_since": datetime.utcnow()}}
+    )
+
+async def end_link_writes(user_ids: List[str]):
+    """Clear the in-flight flag of writes that changed no counts, or failed"""
+    await db.vault_stats.update_many(
+        {"user_id": {"$in": user_ids}},
+        {"$inc": {"version": 1, "pending_writes": -1}}
+    )
+
+async def adjust_vault_stats(user_id: str, links: List[dict], delta: int, activity: Optional[str] = None,
+                             archived: bool = False):
+    """Apply created (delta=1) or removed (delta=-1) links to the user's db.vault_stats summary in one $inc.
+
+    Counts cover the hot vault_links collection; archiving and restoring move links
+    between total and the separate archived counter. archived=True applies the change
+    to links that live in the archive, which only move the archived counter. Users without a summary are
+    skipped: rebuild_vault_stats creates it from a full count, which a partial
+    upsert here would otherwise pre-empt. Every change bumps version so a
+    concurrent rebuild can tell its count is out of date, and completes the
+    write begun with begin_link_writes.
+    """
+    if not links:
+        return
+    now = datetime.utcnow()
+    activity = activity or ("created" if delta > 0 else "deleted")
+    inc = {f"activity.{now:%Y-%m-%d}.{activity}": len(links), "version": 1, "pending_writes": -1}
+    if archived:
+        inc["archived"] = delta * len(links)
+    else:
+        inc["total"] = delta * len(links)
+        if activity in ("archived", "restored"):
+            inc["archived"] = -delta * len(links)
+        for level, n in Counter(link.get("access_level", "Restricted") for link in links).items():
+            inc[f"by_access_level.{level}"] = delta * n
+    await db.vault_stats.update_one(
+        {"user_id": user_id},
+        {"$inc": inc, "$set": {f"last_{activity}_at": now}}
+    )
+
+async def record_link_changes(user_id: str, links: List[dict], delta: int, activity: Optional[str] = None,
+                              archived: bool = False):
+    """Update every incrementally maintained summary after links are inserted or removed"""
+    await adjust_vault_stats(user_id, links, delta, activity, archived)
+    if not archived:
+        # Tag counts only cover the hot collection
+        await adjust_tag_counts(user_id, [tag for link in links for tag in link.get("tags", [])], delta)
+    vault_link_list_cache.invalidate(user_id)
+
+async def record_link_update(user_id: str, before: dict, after: dict):
+    """Update the summaries after a link's tags or folder changed; only tag counts depend on them"""
+    old_tags, new_tags = set(before.get("tags", [])), set(after.get("tags", []))
+    await adjust_tag_counts(user_id, sorted(old_tags - new_tags), -1)
+    await adjust_tag_counts(user_id, sorted(new_tags - old_tags), 1)
+    vault_link_list_cache.invalidate(user_id)
+
+def new_vault_link(user: User, link_data: VaultLinkCreate, link_id: Optional[str] = None) -> VaultLink:
     vault_link = VaultLink(
         user_id=user.id,
         url=link_data.url,
         name=link_data.name,
-        access_level=link_data.access_level
+        access_level=link_data.access_level,
+        tags=link_data.tags,
+        folder=link_data.folder
     )
+    vault_link.last_accessed_at = vault_link.created_at
+    if link_id:
+        vault_link.id = link_id
+    return vault_link
+
+async def announce_vault_link(user: User, vault_link: VaultLink):
+    """Bookkeeping after a link has been stored: summaries, caches and live events"""
+    await record_link_changes(user.id, [vault_link.dict()], 1)
+    await vault_events.publish(user.id, "link_created", jsonable_encoder(vault_link))
+
+async def insert_vault_link(user: User, link_data: VaultLinkCreate) -> VaultLink:
+    vault_link = new_vault_link(user, link_data)
+    await begin_link_writes([user.id])
+    try:
+        await db.vault_links.insert_one(vault_link.dict())
+    except Exception:
+        await end_link_writes([user.id])
+        raise
+    await announce_vault_link(user, vault_link)
+    return vault_link
+
+async def create_idempotent_vault_link(user: User, link_data: VaultLinkCreate, idempotency_key: str) -> VaultLink:
+    """Claim the key in the unique (user_id, key) index, then insert; replays return the stored link.
+
+    A claim is "pending" until the link is stored, then "completed" with a copy of
+    the created link, so replays keep returning it even after the link is deleted
+    or archived. A pending claim older than IDEMPOTENCY_CLAIM_LEASE belongs to a
+    request that died and is taken over by the next one.
+    """
+    fingerprint = request_fingerprint(link_data)
+    now = datetime.utcnow()
+    claim = {
+        "user_id": user.id,
+        "key": idempotency_key,
+        "link_id": str(uuid.uuid4()),
+        "fingerprint": fingerprint,
+        "status": "pending",
+        "claimed_at": now,
+        "created_at": now,
+        "expires_at": now + IDEMPOTENCY_KEY_TTL
+    }
     
-    await db.vault_links.insert_one(vault_link.dict())
+    try:
+        await db.idempotency_keys.insert_one(claim)
+    except DuplicateKeyError:
+        existing = await db.idempotency_keys.find_one({"user_id": user.id, "key": idempotency_key})
+        if existing and existing["expires_at"] <= now:
+            # The TTL monitor has not removed the expired key yet; drop it and claim afresh
+            await db.idempotency_keys.delete_one({"_id": existing["_id"], "expires_at": existing["expires_at"]})
+            return await create_idempotent_vault_link(user, link_data, idempotency_key)
+        if not existing:
+            return await create_idempotent_vault_link(user, link_data, idempotency_key)
+        if existing["fingerprint"] != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+        if existing["status"] == "completed":
+            return VaultLink(**existing["link"])
+        if existing["claimed_at"] > now - IDEMPOTENCY_CLAIM_LEASE:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        
+        # The claimant died mid-request: take the claim over, keeping its link id
+        result = await db.idempotency_keys.update_one(
+            {"_id": existing["_id"], "status": "pending", "claimed_at": existing["claimed_at"]},
+            {"$set": {"claimed_at": now}}
+        )
+        if not result.modified_count:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+        claim = {**existing, "claimed_at": now}
+    
+    vault_link = new_vault_link(user, link_data, link_id=claim["link_id"])
+    await begin_link_writes([user.id])
+    try:
+        await db.vault_links.insert_one(vault_link.dict())
+        stored = True
+    except DuplicateKeyError:
+        # A taken-over claim whose original insert had already landed
+        await end_link_writes([user.id])
+        link = await db.vault_links.find_one({"id": claim["link_id"], "user_id": user.id})
+        if not link:
+            raise HTTPException(status_code=410, detail="The link created with this Idempotency-Key no longer exists")
+        vault_link = VaultLink(**link)
+        stored = False
+    except Exception:
+        # Nothing was stored: release the claim so the client can retry with the same key
+        await end_link_writes([user.id])
+        await db.idempotency_keys.delete_one({"user_id": user.id, "key": idempotency_key, "claimed_at": claim["claimed_at"]})
+        raise
+    
+    await db.idempotency_keys.update_one(
+        {"user_id": user.id, "key": idempotency_key},
+        {"$set": {"status": "completed", "completed_at": datetime.utcnow(), "link": vault_link.dict()}}
+    )
+    if stored:
+        await announce_vault_link(user, vault_link)
     return vault_link
 
+# Vault statistics
+STATS_ACTIVITY_DAYS = 7
+STATS_ACTIVITY_RETENTION_DAYS = 30
+
+async def count_links_by_access_level(user_ids: List[str]) -> Dict[str, Dict[str, int]]:
+    counts = {user_id: {} for user_id in user_ids}
+    pipeline = [
+        {"$match": {"user_id": {"$in": user_ids}}},
+        {"$group": {"_id": {"user_id": "$user_id", "access_level": "$access_level"}, "count": {"$sum": 1}}}
+    ]
+    async for row in db.vault_links.aggregate(pipeline):
+        counts[row["_id"]["user_id"]][row["_id"]["access_level"]] = row["count"]
+    return counts
+
+async def count_archived_links(user_ids: List[str]) -> Dict[str, int]:
+    counts = {user_id: 0 for user_id in user_ids}
+    pipeline = [
+        {"$match": {"user_id": {"$in": user_ids}}},
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}}
+    ]
+    async for row in db.vault_links_archive.aggregate(pipeline):
+        counts[row["_id"]] = row["count"]
+    return counts
+
+async def rebuild_vault_stats(user_ids: List[str], attempts: int = 3) -> List[dict]:
+    """Recount links for user_ids, correct their summaries and return any drift found.
+
+    Corrections are applied as $inc against the summary version read before
+    counting, so increments from concurrent writes are never overwritten; users
+    whose summary changed meanwhile, or who have writes in flight (see
+    begin_link_writes), are recounted. A flag older than VAULT_STATS_WRITE_LEASE
+    was left by a process that died mid-write and is cleared by the correction.
+    """
+    cutoff = f"{datetime.utcnow() - timedelta(days=STATS_ACTIVITY_RETENTION_DAYS):%Y-%m-%d}"
+    drift = []
+    pending = list(user_ids)
+    for attempt in range(attempts):
+        if not pending:
+            break
+        if attempt:
+            await asyncio.sleep(0.1 * attempt)
+        # Read summaries before counting so any write racing with the count bumps their version
+        summaries = {doc["user_id"]: doc async for doc in db.vault_stats.find({"user_id": {"$in": pending}})}
+        counts = await count_links_by_access_level(pending)
+        archived = await count_archived_links(pending)
+        
+        changed = []
+        for user_id in pending:
+            expected = counts[user_id]
+            summary = summaries.get(user_id)
+            report = {
+                "user_id": user_id,
+                "expected": expected,
+                "actual": {level: n for level, n in (summary or {}).get("by_access_level", {}).items() if n},
+                "expected_total": sum(expected.values()),
+                "actual_total": (summary or {}).get("total", 0),
+                "expected_archived": archived[user_id],
+                "actual_archived": (summary or {}).get("archived", 0)
+            }
+            
+            if summary is None:
+                await db.vault_stats.update_one({"user_id": user_id}, {"$setOnInsert": {
+                    "total": report["expected_total"],
+                    "by_access_level": expected,
+                    "archived": report["expected_archived"],
+                    "version": 0
+                }}, upsert=True)
+                if report["expected_total"] or report["expected_archived"]:
+                    drift.append(report)
+                continue
+            
+            in_flight = summary.get("pending_writes", 0)
+            if in_flight and summary.get("pending_since", datetime.min) > datetime.utcnow() - VAULT_STATS_WRITE_LEASE:
+                changed.append(user_id)
+                continue
+            
+            inc = {}
+            for level in set(expected) | set(summary.get("by_access_level", {})):
+                correction = expected.get(level, 0) - summary.get("by_access_level", {}).get(level, 0)
+                if correction:
+                    inc[f"by_access_level.{level}"] = correction
+            for field in ("total", "archived"):
+                correction = report[f"expected_{field}"] - report[f"actual_{field}"]
+                if correction:
+                    inc[field] = correction
+            stale_days = [day for day in summary.get("activity", {}) if day < cutoff]
+            
+            update = {}
+            if inc:
+                inc["version"] = 1
+                update["$inc"] = inc
+            if in_flight:
+                update["$set"] = {"pending_writes": 0}
+            if stale_days:
+                update["$unset"] = {f"activity.{day}": "" for day in stale_days}
+            if not update:
+                continue
+            
+            result = await db.vault_stats.update_one({"user_id": user_id, "version": summary.get("version")}, update)
+            if not result.matched_count:
+                changed.append(user_id)
+            elif inc:
+                drift.append(report)
+        pending = changed
+    
+    if pending:
+        logger.warning("Vault stats for %d users kept changing during reconciliation: %s", len(pending), pending)
+    return drift
+
+async def reconcile_vault_stats(batch_size: int = 200) -> List[dict]:
+    """Rebuild every user's summary in batches, logging and returning the drift that was corrected"""
+    drift = []
+    last_id = ""
+    while True:
+        users = await db.users.find({"id": {"$gt": last_id}}, {"id": 1}).sort("id", 1).limit(batch_size).to_list(batch_size)
+        if not users:
+            break
+        last_id = users[-1]["id"]
+        batch_drift = await rebuild_vault_stats([user["id"] for user in users])
+        for entry in batch_drift:
+            logger.warning("Vault stats drift for user %s: expected %s (total %d, archived %d), "
+                           "found %s (total %d, archived %d)",
+                           entry["user_id"], entry["expected"], entry["expected_total"], entry["expected_archived"],
+                           entry["actual"], entry["actual_total"], entry["actual_archived"])
+        drift.extend(batch_drift)
+    logger.info("Reconciled vault stats; %d summaries drifted", len(drift))
+    return drift
+
+# Cold-tier archival
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", 180))
+# Block compressor for vault_links_archive when startup creates it; empty keeps the server default (snappy)
+ARCHIVE_BLOCK_COMPRESSOR = os.environ.get("ARCHIVE_BLOCK_COMPRESSOR", "zstd")
+# What an archived link keeps; names match vault_links so the same list filters apply to both
+ARCHIVED_LINK_FIELDS = ("id", "user_id", "url", "name", "access_level", "tags", "folder", "created_at")
+
+def compact_archived_link(link: dict, archived_at: datetime) -> dict:
+    """The archive form of a link: empty fields and last_accessed_at (reset on restore) are dropped"""
+    archived = {field: link[field] for field in ARCHIVED_LINK_FIELDS if link.get(field)}
+    archived["archived_at"] = archived_at
+    return archived
+
+async def archive_stale_links(max_age_days: int = ARCHIVE_AFTER_DAYS, batch_size: int = 500) -> int:
+    """Move links not opened for max_age_days from vault_links into vault_links_archive in batches.
+
+    Archived links are stored in the compact form of compact_archived_link, in a
+    collection created with ARCHIVE_BLOCK_COMPRESSOR (zstd) block compression,
+    which suits rarely read data better than the default snappy.
+
+    Each batch is copied first, then removed with one delete_many that repeats
+    the staleness check; links opened meanwhile stay. A link its owner deleted
+    meanwhile is told apart by its missing archive copy, which delete_vault_link
+    removes after the link itself.
+
+    Run one job at a time (python server.py archive-links). The job runs in its own
+    process, so its link_archived events only reach connected clients with
+    VAULT_EVENTS_BROKER=change_stream; with the local broker, clients see the
+    change on their next list fetch, after each worker's LIST_CACHE_TTL at most.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+    stale = {"$or": [
+        {"last_accessed_at": {"$lt": cutoff}},
+        {"last_accessed_at": None, "created_at": {"$lt": cutoff}}
+    ]}
+    archived = 0
+    while True:
+        links = await db.vault_links.find(stale).limit(batch_size).to_list(batch_size)
+        if not links:
+            break
+        
+        now = datetime.utcnow()
+        by_id = {link["id"]: link for link in links}
+        ids = list(by_id)
+        user_ids = sorted({link["user_id"] for link in links})
+        await begin_link_writes(user_ids)
+        try:
+            try:
+                await db.vault_links_archive.insert_many(
+                    [compact_archived_link(link, now) for link in links], ordered=False
+                )
+            except BulkWriteError as e:
+                # Links copied by an interrupted earlier run are already archived; anything else is a real failure
+                if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                    raise
+            
+            present = [doc["id"] async for doc in db.vault_links.find({"id": {"$in": ids}}, {"id": 1})]
+            result = await db.vault_links.delete_many({"id": {"$in": present}, **stale})
+            kept = {doc["id"] async for doc in db.vault_links.find({"id": {"$in": present}}, {"id": 1})}
+            gone = [link_id for link_id in present if link_id not in kept]
+            copied = {doc["id"] async for doc in db.vault_links_archive.find({"id": {"$in": gone}}, {"id": 1})}
+            removed = [by_id[link_id] for link_id in gone if link_id in copied]
+            # Copies of links deleted by their owner before the delete, or opened since the find
+            dropped = [link_id for link_id in ids if link_id not in copied]
+            if dropped:
+                await db.vault_links_archive.delete_many({"id": {"$in": dropped}})
+        except Exception:
+            await end_link_writes(user_ids)
+            raise
+        if len(removed) != result.deleted_count:
+            # An owner's delete landed between our delete and its removal of the archive copy
+            logger.warning("Archived %d links but removed %d; run reconcile-stats for users %s",
+                           len(removed), result.deleted_count, user_ids)
+        
+        by_user = {}
+        for link in removed:
+            by_user.setdefault(link["user_id"], []).append(link)
+        unchanged = [user_id for user_id in user_ids if user_id not in by_user]
+        if unchanged:
+            await end_link_writes(unchanged)
+        for user_id, user_links in by_user.items():
+            await record_link_changes(user_id, user_links, -1, activity="archived")
+            for link in user_links:
+                await vault_events.publish(user_id, "link_archived", {"id": link["id"]})
+        archived += len(removed)
+    
+    logger.info("Archived %d links untouched for %d days", archived, max_age_days)
+    return archived
+
+# VaultLink endpoints
+@api_router.post("/vault-links", response_model=VaultLink)
+async def create_vault_link(link_data: VaultLinkCreate, session_token: str,
+                            idempotency_key: Optional[str] = Header(None)):
+    """Create a new vault link; an Idempotency-Key header makes retries return the original link"""
+    user = await get_current_user(session_token)
+    
+    if not idempotency_key:
+        return await insert_vault_link(user, link_data)
+    
+    # Only identical bodies may share a result; a different body must reach the 422 check
+    return await link_creation_coalescer.run(
+        (user.id, idempotency_key, request_fingerprint(link_data)),
+        lambda: create_idempotent_vault_link(user, link_data, idempotency_key)
+    )
+
 @api_router.get("/vault-links", response_model=List[VaultLink])
-async def get_vault_links(session_token: str):
-    """Get all vault links for the current user"""
+async def get_vault_links(request: Request, session_token: str,
+                          tag: Optional[str] = None, folder: Optional[str] = None,
+                          include_archived: bool = False):
+    """Get vault links for the current user, optionally filtered by tag and/or folder"""
     user = await get_current_user(session_token)
     
-    vault_links = await db.vault_links.find({"user_id": user.id}).sort("created_at", -1).to_list(1000)
-    return [VaultLink(**link) for link in vault_links]
+    query = {"user_id": user.id}
+    if tag:
+        query["tags"] = normalize_tag(tag)
+    if folder:
+        query["folder"] = folder.strip()
+    variant = (query.get("tags"), query.get("folder"), include_archived)
+    
+    payload = vault_link_list_cache.get(user.id, variant)
+    if payload is None:
+        generation = vault_link_list_cache.generation(user.id)
+        vault_links = await db.vault_links.find(query).sort("created_at", -1).to_list(1000)
+        if include_archived:
+            vault_links += await db.vault_links_archive.find(query).sort("created_at", -1).to_list(1000)
+            vault_links.sort(key=lambda link: link["created_at"], reverse=True)
+            del vault_links[1000:]
+        links = [VaultLink(**link) for link in vault_links]
+        payload = vault_link_list_cache.put(
+            user.id, JSONResponse(jsonable_encoder(links)).body, variant, generation=generation
+        )
+    return payload_response(request, payload)
+
+@api_router.get("/vault-links/tags", response_model=List[TagCount])
+async def get_tag_counts(session_token: str):
+    """Get the number of links per tag for the current user"""
+    user = await get_current_user(session_token)
+    
+    counts = await db.tag_counts.find({"user_id": user.id, "count": {"$gt": 0}}).sort("tag", 1).to_list(1000)
+    return [TagCount(tag=doc["tag"], count=doc["count"]) for doc in counts]
+
+@api_router.get("/vault-links/stats", response_model=VaultStats)
+async def get_vault_stats(session_token: str):
+    """Get link counts and recent activity for the current user"""
+    user = await get_current_user(session_token)
+    
+    summary = await db.vault_stats.find_one({"user_id": user.id})
+    if not summary:
+        # Links created before summaries existed: build this user's summary once
+        await rebuild_vault_stats([user.id])
+        summary = await db.vault_stats.find_one({"user_id": user.id}) or {}
+    
+    today = datetime.utcnow()
+    activity = summary.get("activity", {})
+    recent = []
+    for offset in range(STATS_ACTIVITY_DAYS):
+        day = f"{today - timedelta(days=offset):%Y-%m-%d}"
+        recent.append(ActivityDay(date=day, **activity.get(day, {})))
+    
+    return VaultStats(
+        total=summary.get("total", 0),
+        archived=summary.get("archived", 0),
+        by_access_level={level: n for level, n in summary.get("by_access_level", {}).items() if n},
+        recent_activity=recent,
+        last_created_at=summary.get("last_created_at"),
+        last_deleted_at=summary.get("last_deleted_at")
+    )
+
+@api_router.get("/vault-links/stream")
+async def stream_vault_links(session_token: str, last_event_id: Optional[str] = Header(None)):
+    """Server-sent events for link changes made on any of the user's devices"""
+    session, user = await get_current_session(session_token)
+    expires_at = session.get("expires_at", datetime.max)
+    subscription, replay = vault_events.subscribe(user.id, last_event_id)
+    # Sets the browser's last event id even before any event arrives, so a reconnect can resume
+    position = vault_events.position()
+    
+    async def event_stream():
+        try:
+            yield f"retry: 3000\nid: {position}\n\n"
+            for event in replay:
+                yield format_sse(event)
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    event = ": heartbeat\n\n"
+                if event is None or datetime.utcnow() > expires_at:
+                    # Dropped as a slow consumer, or the session lapsed: the client reconnects
+                    # and resumes, or fails authentication and has to sign in again
+                    break
+                yield event if isinstance(event, str) else format_sse(event)
+        finally:
+            vault_events.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @api_router.delete("/vault-links/{link_id}")
 async def delete_vault_link(link_id: str, session_token: str):
@@ -178,16 +1117,381 @@ async def delete_vault_link(link_id: str, session_token: str):
     
     # Check if link exists and belongs to user
     link = await db.vault_links.find_one({"id": link_id, "user_id": user.id})
-    if not link:
-        raise HTTPException(status_code=404, detail="Link not found")
+    deleted = False
+    archived_link = None
+    await begin_link_writes([user.id])
+    try:
+        if link:
+            # Delete the link, then any copy an archive run made meanwhile; the run relies on this order
+            result = await db.vault_links.delete_one({"id": link_id, "user_id": user.id})
+            deleted = bool(result.deleted_count)
+            if deleted:
+                await db.vault_links_archive.delete_one({"id": link_id, "user_id": user.id})
+        if not deleted:
+            # Archived, possibly by a run that moved it after the find above
+            archived_link = await db.vault_links_archive.find_one_and_delete({"id": link_id, "user_id": user.id})
+    except Exception:
+        await end_link_writes([user.id])
+        raise
     
-    # Delete the link
-    await db.vault_links.delete_one({"id": link_id, "user_id": user.id})
+    if deleted:
+        await record_link_changes(user.id, [link], -1)
+    elif archived_link:
+        await record_link_changes(user.id, [archived_link], -1, archived=True)
+    else:
+        await end_link_writes([user.id])
+        if not link:
+            raise HTTPException(status_code=404, detail="Link not found")
+    await vault_events.publish(user.id, "link_deleted", {"id": link_id})
     return {"message": "Link deleted successfully"}
 
+@api_router.patch("/vault-links/{link_id}", response_model=VaultLink)
+async def update_vault_link(link_id: str, changes: VaultLinkUpdate, session_token: str):
+    """Change the tags or folder of a link"""
+    user = await get_current_user(session_token)
+    
+    updates = changes.dict(exclude_unset=True)
+    if updates.get("tags") is None:
+        updates.pop("tags", None)
+    if not updates:
+        link = await db.vault_links.find_one({"id": link_id, "user_id": user.id})
+        if not link:
+            raise HTTPException(status_code=404, detail="Link not found")
+        return VaultLink(**link)
+    
+    # The document as it was right before this update, so concurrent edits each apply their own tag diff
+    before = await db.vault_links.find_one_and_update(
+        {"id": link_id, "user_id": user.id},
+        {"$set": updates},
+        return_document=ReturnDocument.BEFORE
+    )
+    if not before:
+        raise HTTPException(status_code=404, detail="Link not found")
+    vault_link = VaultLink(**{**before, **updates})
+    await record_link_update(user.id, before, vault_link.dict())
+    await vault_events.publish(user.id, "link_updated", jsonable_encoder(vault_link))
+    return vault_link
+
+@api_router.post("/vault-links/{link_id}/open")
+async def record_link_open(link_id: str, session_token: str):
+    """Record that a link was opened, keeping it out of the archive"""
+    user = await get_current_user(session_token)
+    
+    result = await db.vault_links.update_one(
+        {"id": link_id, "user_id": user.id},
+        {"$set": {"last_accessed_at": datetime.utcnow()}}
+    )
+    if not result.matched_count:
+        raise HTTPException(status_code=404, detail="Link not found")
+    # Opens publish no event, so other workers may show the old last_accessed_at until LIST_CACHE_TTL
+    vault_link_list_cache.invalidate(user.id)
+    return {"message": "Link access recorded"}
+
+@api_router.post("/vault-links/{link_id}/restore", response_model=VaultLink)
+async def restore_vault_link(link_id: str, session_token: str):
+    """Move an archived link back into the active vault"""
+    user = await get_current_user(session_token)
+    
+    link = await db.vault_links_archive.find_one({"id": link_id, "user_id": user.id})
+    if not link:
+        raise HTTPException(status_code=404, detail="Archived link not found")
+    
+    # Archived links are stored compactly; fill the omitted fields back in
+    link = VaultLink(**link).dict()
+    link["archived_at"] = None
+    link["last_accessed_at"] = datetime.utcnow()
+    # Counts change only once the link has left the archive too
+    await begin_link_writes([user.id])
+    try:
+        try:
+            await db.vault_links.insert_one(link)
+            restored = True
+        except DuplicateKeyError:
+            restored = False  # A concurrent restore already moved it back
+        await db.vault_links_archive.delete_one({"id": link_id, "user_id": user.id})
+    except Exception:
+        await end_link_writes([user.id])
+        raise
+    link.pop("_id", None)
+    if restored:
+        await record_link_changes(user.id, [link], 1, activity="restored")
+    else:
+        await end_link_writes([user.id])
+    
+    vault_link = VaultLink(**link)
+    await vault_events.publish(user.id, "link_restored", jsonable_encoder(vault_link))
+    return vault_link
+
+# Admission control and rate limiting
+def _query_param(scope, name: str) -> Optional[str]:
+    values = parse_qs(scope.get("query_string", b"").decode("latin-1")).get(name)
+    return values[0] if values else None
+
+async def _reject(scope, receive, send, status_code: int, detail: str, retry_after: float):
+    response = JSONResponse(
+        {"detail": detail},
+        status_code=status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+    await response(scope, receive, send)
+
+async def resolve_session_user(session_token: str) -> Optional[str]:
+    """Return the user id for a live session token, or None"""
+    session = await db.sessions.find_one({"session_token": session_token})
+    if not session or datetime.utcnow() > session.get("expires_at", datetime.utcnow()):
+        return None
+    return session["user_id"]
+
+class RateLimitBackend(ABC):
+    """Token bucket storage. Subclass this to share buckets across workers (e.g. Redis)."""
+
+    @abstractmethod
+    async def consume(self, key: str, rate: float, burst: int) -> float:
+        """Take one token for key. Returns 0 if allowed, otherwise seconds until the next token."""
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Per-process token buckets, evicting the least recently seen keys past max_keys"""
+
+    def __init__(self, max_keys: int = 10000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+
+    async def consume(self, key: str, rate: float, burst: int) -> float:
+        now = self.clock()
+        tokens, last = self._buckets.pop(key, (float(burst), now))
+        tokens = min(float(burst), tokens + (now - last) * rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+class RateLimitMiddleware:
+    """Per-session rate limiting, falling back to the client address for anonymous calls.
+
+    A session token only gets its own bucket once session_resolver has confirmed it,
+    so made-up tokens are charged (and looked up) against the caller's address.
+    trusted_proxy_hops is the number of proxies in front of the app that append
+    to X-Forwarded-For; the client address is read from that position.
+
+    This middleware sits outside admission control, so session lookups get their
+    own bound: beyond max_resolving concurrent lookups, a token simply stays
+    unverified (charged to its address) for that request instead of queueing on
+    the database.
+    """
+
+    def __init__(self, app, backend: Optional[RateLimitBackend] = None, rate: float = 5.0, burst: int = 20,
+                 session_resolver=None, trusted_proxy_hops: int = 0, max_resolving: int = 8,
+                 verified_ttl: float = 60.0, max_verified: int = 10000, clock=time.monotonic):
+        self.validate_config(rate, burst)
+        self.app = app
+        self.backend = backend or InMemoryRateLimitBackend()
+        self.rate = rate
+        self.burst = burst
+        self.session_resolver = session_resolver
+        self.trusted_proxy_hops = trusted_proxy_hops
+        self.verified_ttl = verified_ttl
+        self.max_verified = max_verified
+        self.clock = clock
+        self._verified = OrderedDict()
+        self._resolving = asyncio.Semaphore(max_resolving)
+
+    @staticmethod
+    def validate_config(rate: float, burst: int):
+        if rate <= 0:
+            raise ValueError("Rate limit must be greater than 0 requests per second")
+        if burst < 1:
+            raise ValueError("Rate limit burst must be at least 1")
+
+    def client_address(self, scope) -> str:
+        if self.trusted_proxy_hops:
+            forwarded = Headers(scope=scope).get("x-forwarded-for")
+            hosts = [host.strip() for host in forwarded.split(",")] if forwarded else []
+            if len(hosts) >= self.trusted_proxy_hops:
+                return hosts[-self.trusted_proxy_hops]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def _verified_session(self, session_token: str) -> bool:
+        verified_at = self._verified.get(session_token)
+        if verified_at is None:
+            return False
+        if self.clock() - verified_at > self.verified_ttl:
+            del self._verified[session_token]
+            return False
+        return True
+
+    def _remember_session(self, session_token: str):
+        self._verified[session_token] = self.clock()
+        self._verified.move_to_end(session_token)
+        if len(self._verified) > self.max_verified:
+            self._verified.popitem(last=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        session_token = _query_param(scope, "session_token")
+        if session_token and self._verified_session(session_token):
+            key = f"session:{session_token}"
+        else:
+            key = f"addr:{self.client_address(scope)}"
+
+        wait = await self.backend.consume(key, self.rate, self.burst)
+        if wait > 0:
+            await _reject(scope, receive, send, 429, "Too many requests", wait)
+            return
+
+        if key.startswith("addr:") and session_token and self.session_resolver and not self._resolving.locked():
+            async with self._resolving:
+                if await self.session_resolver(session_token):
+                    self._remember_session(session_token)
+        await self.app(scope, receive, send)
+
+class AdmissionControlMiddleware:
+    """Bounds concurrent requests; excess requests wait in a bounded queue or get a fast 503"""
+
+    def __init__(self, app, max_in_flight: int = 64, max_queue: int = 128,
+                 queue_timeout: float = 5.0, retry_after: float = 1.0, exempt_paths=()):
+        self.validate_config(max_in_flight, max_queue, queue_timeout)
+        self.app = app
+        self.exempt_paths = set(exempt_paths)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._waiting = 0
+
+    @staticmethod
+    def validate_config(max_in_flight: int, max_queue: int, queue_timeout: float):
+        if max_in_flight < 1:
+            raise ValueError("Admission control needs at least 1 in-flight request")
+        if max_queue < 0:
+            raise ValueError("Admission queue size cannot be negative")
+        if queue_timeout <= 0:
+            raise ValueError("Admission queue timeout must be greater than 0")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        if self._slots.locked():
+            if self._waiting >= self.max_queue:
+                await _reject(scope, receive, send, 503, "Server busy", self.retry_after)
+                return
+            self._waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                await _reject(scope, receive, send, 503, "Server busy", self.retry_after)
+                return
+            finally:
+                self._waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._slots.release()
+
+class CompressionMiddleware:
+    """Compresses complete responses above a size threshold; streamed and pre-encoded ones pass through"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if "content-encoding" in headers or headers.get("content-type", "").startswith("text/event-stream"):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                # Streaming or tiny bodies are not worth buffering or compressing
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = compress_body(body, encoding)
+            headers = MutableHeaders(raw=start_message["headers"])
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# Middleware added last runs first: CORS wraps rate limiting, which wraps admission control,
+# which wraps compression
+app.add_middleware(CompressionMiddleware)
+
+ADMISSION_MAX_IN_FLIGHT = int(os.environ.get("ADMISSION_MAX_IN_FLIGHT", 64))
+ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", 128))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 5.0))
+RATE_LIMIT_PER_SECOND = float(os.environ.get("RATE_LIMIT_PER_SECOND", 5.0))
+RATE_LIMIT_BURST = int(os.environ.get("RATE_LIMIT_BURST", 20))
+TRUSTED_PROXY_HOPS = int(os.environ.get("TRUSTED_PROXY_HOPS", 0))
+
+# Starlette builds the middleware stack on the first request; fail at import instead
+AdmissionControlMiddleware.validate_config(ADMISSION_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT)
+RateLimitMiddleware.validate_config(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+
+app.add_middleware(
+    AdmissionControlMiddleware,
+    max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+    max_queue=ADMISSION_MAX_QUEUE,
+    queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+    # Event streams stay open for the life of the page and would pin slots indefinitely
+    exempt_paths={"/api/vault-links/stream"},
+)
+
+app.add_middleware(
+    RateLimitMiddleware,
+    rate=RATE_LIMIT_PER_SECOND,
+    burst=RATE_LIMIT_BURST,
+    session_resolver=resolve_session_user,
+    trusted_proxy_hops=TRUSTED_PROXY_HOPS,
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -203,11 +1507,43 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def create_indexes():
+    await db.vault_links.create_index([("user_id", 1), ("created_at", -1)])
+    await db.vault_links.create_index([("user_id", 1), ("tags", 1), ("created_at", -1)])
+    await db.vault_links.create_index([("user_id", 1), ("folder", 1), ("created_at", -1)])
+    await db.vault_links.create_index("id", unique=True)
+    await db.vault_links.create_index([("last_accessed_at", 1), ("created_at", 1)])
+    if ARCHIVE_BLOCK_COMPRESSOR and "vault_links_archive" not in await db.list_collection_names():
+        try:
+            await db.create_collection("vault_links_archive", storageEngine={
+                "wiredTiger": {"configString": f"block_compressor={ARCHIVE_BLOCK_COMPRESSOR}"}
+            })
+        except CollectionInvalid:
+            pass  # Created by another worker starting up at the same time
+    await db.vault_links_archive.create_index("id", unique=True)
+    await db.vault_links_archive.create_index([("user_id", 1), ("created_at", -1)])
+    await db.tag_counts.create_index([("user_id", 1), ("tag", 1)], unique=True)
+    await db.vault_stats.create_index("user_id", unique=True)
+    await db.idempotency_keys.create_index([("user_id", 1), ("key", 1)], unique=True)
+    await db.idempotency_keys.create_index("expires_at", expireAfterSeconds=0)
+    if isinstance(vault_events, ChangeStreamEventBroker):
+        await db.vault_events.create_index("created_at", expireAfterSeconds=3600)
+    await vault_events.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await vault_events.stop()
     client.close()
 
 if __name__ == "__main__":
-    import uvicorn
-    port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("server:app", host="0.0.0.0", port=port, reload=False)
\ No newline at end of file
+    if sys.argv[1:] == ["reconcile-stats"]:
+        asyncio.run(reconcile_vault_stats())
+    elif sys.argv[1:] == ["archive-links"]:
+        if not isinstance(vault_events, ChangeStreamEventBroker):
+            logger.info("Local event broker: connected clients will not be notified of archived links")
+        asyncio.run(archive_stale_links())
+    else:
+        import uvicorn
+        port = int(os.environ.get("PORT", 8000))
+        uvicorn.run("server:app", host="0.0.0.0", port=port, reload=False)
\ No newline at end of file
@@ -1,10 +1,16 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import "./App.css";
 import axios from "axios";
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+const newIdempotencyKey = () => (
+  window.crypto && window.crypto.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`
+);
+
 // PWA Install Hook
 const usePWAInstall = () => {
   const [isInstallable, setIsInstallable] = useState(false);
@@ -161,16 +167,82 @@ const VaultLinksApp = () => {
   const [formData, setFormData] = useState({
     url: '',
     name: '',
-    access_level: 'Restricted'
+    access_level: 'Restricted',
+    tags: '',
+    folder: ''
   });
+  const [tagCounts, setTagCounts] = useState([]);
+  const [tagFilter, setTagFilter] = useState(null);
+  // Read by the live-update handlers, which are registered once per session
+  const tagFilterRef = useRef(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [showInstallPrompt, setShowInstallPrompt] = useState(false);
+  // One key per submitted form, kept across retries so the server saves the link only once
+  const idempotencyKey = useRef(null);
+
+  useEffect(() => {
+    idempotencyKey.current = null;
+  }, [formData]);
 
   useEffect(() => {
+    tagFilterRef.current = tagFilter;
     if (user && sessionToken) {
       fetchLinks();
+      fetchTags();
+    }
+  }, [user, sessionToken, tagFilter]);
+
+  // Live updates from other devices; EventSource reconnects and resumes by itself
+  useEffect(() => {
+    if (!user || !sessionToken) {
+      return;
     }
+
+    const source = new EventSource(`${API}/vault-links/stream?session_token=${sessionToken}`);
+
+    const matchesFilter = (link) => !tagFilterRef.current || (link.tags || []).includes(tagFilterRef.current);
+
+    const addLink = (e) => {
+      const link = JSON.parse(e.data);
+      fetchTags();
+      if (!matchesFilter(link)) {
+        return;
+      }
+      setLinks((current) => current.some((l) => l.id === link.id)
+        ? current
+        : [...current, link].sort((a, b) => new Date(b.created_at) - new Date(a.created_at)));
+    };
+
+    const updateLink = (e) => {
+      const link = JSON.parse(e.data);
+      fetchTags();
+      setLinks((current) => {
+        const others = current.filter((l) => l.id !== link.id);
+        return matchesFilter(link)
+          ? [...others, link].sort((a, b) => new Date(b.created_at) - new Date(a.created_at))
+          : others;
+      });
+    };
+
+    const removeLink = (e) => {
+      const { id } = JSON.parse(e.data);
+      fetchTags();
+      setLinks((current) => current.filter((l) => l.id !== id));
+    };
+
+    source.addEventListener('link_created', addLink);
+    source.addEventListener('link_restored', addLink);
+    source.addEventListener('link_updated', updateLink);
+    source.addEventListener('link_deleted', removeLink);
+    source.addEventListener('link_archived', removeLink);
+
+    source.addEventListener('resync', () => {
+      fetchLinks();
+      fetchTags();
+    });
+
+    return () => source.close();
   }, [user, sessionToken]);
 
   // Show install prompt after user logs in and uses the app
@@ -186,7 +258,9 @@ const VaultLinksApp = () => {
 
   const fetchLinks = async () => {
     try {
-      const response = await axios.get(`${API}/vault-links?session_token=${sessionToken}`);
+      const tag = tagFilterRef.current;
+      const filter = tag ? `&tag=${encodeURIComponent(tag)}` : '';
+      const response = await axios.get(`${API}/vault-links?session_token=${sessionToken}${filter}`);
       setLinks(response.data);
     } catch (error) {
       console.error('Failed to fetch links:', error);
@@ -198,6 +272,18 @@ const VaultLinksApp = () => {
     }
   };
 
+  const fetchTags = async () => {
+    try {
+      const response = await axios.get(`${API}/vault-links/tags?session_token=${sessionToken}`);
+      setTagCounts(response.data);
+    } catch (error) {
+      // The list still works without the tag filter
+      console.error('Failed to fetch tags:', error);
+    }
+  };
+
+  const parseTags = (value) => value.split(',').map((tag) => tag.trim()).filter(Boolean);
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     setLoading(true);
@@ -216,18 +302,38 @@ const VaultLinksApp = () => {
       return;
     }
 
+    if (!idempotencyKey.current) {
+      idempotencyKey.current = newIdempotencyKey();
+    }
+
     try {
-      await axios.post(`${API}/vault-links?session_token=${sessionToken}`, formData);
+      const headers = { 'Idempotency-Key': idempotencyKey.current };
+      const payload = { ...formData, tags: parseTags(formData.tags), folder: formData.folder.trim() || null };
+      for (let attempt = 0; ; attempt++) {
+        try {
+          await axios.post(`${API}/vault-links?session_token=${sessionToken}`, payload, { headers });
+          break;
+        } catch (err) {
+          // Retry only when the request may not have reached the server
+          if (err.response || attempt >= 2) {
+            throw err;
+          }
+          await new Promise((resolve) => setTimeout(resolve, 1000 * (attempt + 1)));
+        }
+      }
       
       // Reset form
       setFormData({
         url: '',
         name: '',
-        access_level: 'Restricted'
+        access_level: 'Restricted',
+        tags: '',
+        folder: ''
       });
       
       // Refresh links
       fetchLinks();
+      fetchTags();
     } catch (error) {
       console.error('Failed to create link:', error);
       if (!isOnline) {
@@ -248,6 +354,7 @@ const VaultLinksApp = () => {
     try {
       await axios.delete(`${API}/vault-links/${linkId}?session_token=${sessionToken}`);
       fetchLinks();
+      fetchTags();
     } catch (error) {
       console.error('Failed to delete link:', error);
       if (!isOnline) {
@@ -258,8 +365,33 @@ const VaultLinksApp = () => {
     }
   };
 
-  const openLink = (url) => {
-    window.open(url, '_blank', 'noopener,noreferrer');
+  const handleEditTags = async (link) => {
+    const tags = window.prompt('Tags (comma separated)', (link.tags || []).join(', '));
+    if (tags === null) {
+      return;
+    }
+    const folder = window.prompt('Folder (leave empty for none)', link.folder || '');
+    if (folder === null) {
+      return;
+    }
+
+    try {
+      await axios.patch(`${API}/vault-links/${link.id}?session_token=${sessionToken}`, {
+        tags: parseTags(tags),
+        folder
+      });
+      fetchLinks();
+      fetchTags();
+    } catch (error) {
+      console.error('Failed to update link:', error);
+      setError(error.response?.status === 422 ? 'Tags or folder name too long' : 'Failed to update link');
+    }
+  };
+
+  const openLink = (link) => {
+    window.open(link.url, '_blank', 'noopener,noreferrer');
+    // Opened links stay out of the archive; failures here don't matter to the user
+    axios.post(`${API}/vault-links/${link.id}/open?session_token=${sessionToken}`).catch(() => {});
   };
 
   if (!user) {
@@ -376,6 +508,35 @@ const VaultLinksApp = () => {
               </select>
             </div>
 
+            <div className="grid grid-cols-1 sm:grid-cols-2 gap-4">
+              <div>
+                <label className="block text-sm font-medium text-gray-700 mb-2">
+                  Tags
+                </label>
+                <input
+                  type="text"
+                  value={formData.tags}
+                  onChange={(e) => setFormData({...formData, tags: e.target.value})}
+                  placeholder="e.g., work, finance"
+                  className="w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-transparent outline-none transition duration-200"
+                />
+              </div>
+
+              <div>
+                <label className="block text-sm font-medium text-gray-700 mb-2">
+                  Folder
+                </label>
+                <input
+                  type="text"
+                  value={formData.folder}
+                  onChange={(e) => setFormData({...formData, folder: e.target.value})}
+                  placeholder="e.g., Projects"
+                  maxLength={100}
+                  className="w-full px-4 py-3 border border-gray-300 rounded-lg focus:ring-2 focus:ring-indigo-500 focus:border-transparent outline-none transition duration-200"
+                />
+              </div>
+            </div>
+
             {error && (
               <div className="text-red-600 text-sm bg-red-50 p-3 rounded-lg">
                 {error}
@@ -398,6 +559,26 @@ const VaultLinksApp = () => {
             Your Links ({links.length})
           </h2>
 
+          {tagCounts.length > 0 && (
+            <div className="flex flex-wrap gap-2 mb-4">
+              <button
+                onClick={() => setTagFilter(null)}
+                className={`px-3 py-1 rounded-full text-xs font-medium ${!tagFilter ? 'bg-indigo-600 text-white' : 'bg-gray-100 text-gray-700 hover:bg-gray-200'}`}
+              >
+                All
+              </button>
+              {tagCounts.map(({ tag, count }) => (
+                <button
+                  key={tag}
+                  onClick={() => setTagFilter(tag === tagFilter ? null : tag)}
+                  className={`px-3 py-1 rounded-full text-xs font-medium ${tag === tagFilter ? 'bg-indigo-600 text-white' : 'bg-gray-100 text-gray-700 hover:bg-gray-200'}`}
+                >
+                  {tag} ({count})
+                </button>
+              ))}
+            </div>
+          )}
+
           {links.length === 0 ? (
             <div className="text-center py-12">
               <svg className="w-12 h-12 text-gray-400 mx-auto mb-4" fill="none" stroke="currentColor" viewBox="0 0 24 24">
@@ -413,7 +594,7 @@ const VaultLinksApp = () => {
                     <div className="flex-1 min-w-0">
                       <div className="flex items-center space-x-3">
                         <button
-                          onClick={() => openLink(link.url)}
+                          onClick={() => openLink(link)}
                           className="text-indigo-600 hover:text-indigo-800 font-medium text-left truncate max-w-xs sm:max-w-md"
                         >
                           {link.name}
@@ -429,8 +610,30 @@ const VaultLinksApp = () => {
                       <p className="text-sm text-gray-500 truncate mt-1">
                         {link.url}
                       </p>
+                      {(link.folder || (link.tags || []).length > 0) && (
+                        <div className="flex flex-wrap items-center gap-1 mt-2">
+                          {link.folder && (
+                            <span className="text-xs text-gray-600 mr-1">{link.folder}</span>
+                          )}
+                          {(link.tags || []).map((tag) => (
+                            <span key={tag} className="px-2 py-0.5 rounded-full text-xs bg-indigo-50 text-indigo-700">
+                              {tag}
+                            </span>
+                          ))}
+                        </div>
+                      )}
                     </div>
                     
+                    <button
+                      onClick={() => handleEditTags(link)}
+                      className="ml-4 text-gray-500 hover:text-gray-700 p-2 rounded-full hover:bg-gray-100 transition duration-200"
+                      title="Edit tags and folder"
+                    >
+                      <svg className="w-4 h-4" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                        <path strokeLinecap="round" strokeLinejoin="round" strokeWidth="2" d="M7 7h.01M7 3h5c.512 0 1.024.195 1.414.586l7 7a2 2 0 010 2.828l-7 7a2 2 0 01-2.828 0l-7-7A1.994 1.994 0 013 12V7a4 4 0 014-4z"></path>
+                      </svg>
+                    </button>
+
                     <button
                       onClick={() => handleDelete(link.id)}
                       className="ml-4 text-red-500 hover:text-red-700 p-2 rounded-full hover:bg-red-50 transition duration-200"
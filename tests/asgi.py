@@ -0,0 +1,32 @@
+"""Minimal ASGI driver so middleware can be tested without an HTTP client"""
+
+
+def http_scope(path="/api/vault-links", query_string=b"", client=("10.0.0.1", 1234), headers=()):
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": path,
+        "query_string": query_string,
+        "client": client,
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers],
+    }
+
+
+async def call(app, scope):
+    """Run one request through app; returns (status, headers dict)"""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    start = messages[0]
+    return start["status"], {name.decode(): value.decode() for name, value in start["headers"]}
+
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
@@ -0,0 +1,37 @@
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+# backend/server.py is run as a script, not installed as a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+SESSION_TOKEN = "session-token-1"
+USER_ID = "user-1"
+
+
+@pytest.fixture
+def vault_db(monkeypatch):
+    """server.db swapped for an in-memory Mongo with indexes and one signed-in user"""
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server
+
+    database = AsyncMongoMockClient()["vaultlinks_test"]
+    monkeypatch.setattr(server, "db", database)
+    # mongomock has no storage engine options
+    monkeypatch.setattr(server, "ARCHIVE_BLOCK_COMPRESSOR", "")
+
+    async def seed():
+        await server.create_indexes()
+        await database.users.insert_one({"id": USER_ID, "email": "ada@example.com", "name": "Ada"})
+        await database.sessions.insert_one({
+            "user_id": USER_ID,
+            "session_token": SESSION_TOKEN,
+            "expires_at": datetime.utcnow() + timedelta(days=1)
+        })
+
+    asyncio.run(seed())
+    return database
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from server import AdmissionControlMiddleware
+from tests.asgi import call, http_scope, ok_app
+
+
+def slow_app(release: asyncio.Event):
+    async def app(scope, receive, send):
+        await release.wait()
+        await ok_app(scope, receive, send)
+    return app
+
+
+def test_requests_within_capacity_pass():
+    middleware = AdmissionControlMiddleware(ok_app, max_in_flight=2, max_queue=0)
+    status, _ = asyncio.run(call(middleware, http_scope()))
+    assert status == 200
+
+
+def test_full_queue_rejects_immediately():
+    async def run():
+        release = asyncio.Event()
+        middleware = AdmissionControlMiddleware(slow_app(release), max_in_flight=1, max_queue=1, queue_timeout=5)
+        running = asyncio.create_task(call(middleware, http_scope()))
+        queued = asyncio.create_task(call(middleware, http_scope()))
+        await asyncio.sleep(0)
+        rejected = await asyncio.wait_for(call(middleware, http_scope()), 1)
+        release.set()
+        return rejected, await running, await queued
+
+    (status, headers), running, queued = asyncio.run(run())
+    assert status == 503
+    assert headers["retry-after"] == "1"
+    assert running[0] == 200
+    assert queued[0] == 200
+
+
+def test_queued_request_times_out():
+    async def run():
+        release = asyncio.Event()
+        middleware = AdmissionControlMiddleware(slow_app(release), max_in_flight=1, max_queue=4, queue_timeout=0.05)
+        running = asyncio.create_task(call(middleware, http_scope()))
+        await asyncio.sleep(0)
+        timed_out = await call(middleware, http_scope())
+        release.set()
+        await running
+        return timed_out[0], middleware._waiting
+
+    assert asyncio.run(run()) == (503, 0)
+
+
+def test_exempt_paths_bypass_the_limit():
+    async def run():
+        release = asyncio.Event()
+        middleware = AdmissionControlMiddleware(
+            slow_app(release), max_in_flight=1, max_queue=0, exempt_paths={"/api/vault-links/stream"}
+        )
+        running = asyncio.create_task(call(middleware, http_scope()))
+        await asyncio.sleep(0)
+        stream = asyncio.create_task(call(middleware, http_scope(path="/api/vault-links/stream")))
+        await asyncio.sleep(0)
+        release.set()
+        return (await stream)[0], (await running)[0]
+
+    assert asyncio.run(run()) == (200, 200)
+
+
+@pytest.mark.parametrize("max_in_flight, max_queue, queue_timeout", [(0, 1, 1), (1, -1, 1), (1, 1, 0)])
+def test_invalid_config_is_rejected(max_in_flight, max_queue, queue_timeout):
+    with pytest.raises(ValueError):
+        AdmissionControlMiddleware(ok_app, max_in_flight, max_queue, queue_timeout)
@@ -0,0 +1,132 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import server
+from tests.asgi import http_scope
+from tests.conftest import SESSION_TOKEN, USER_ID
+
+LONG_AGO = datetime.utcnow() - timedelta(days=server.ARCHIVE_AFTER_DAYS + 1)
+
+
+def seed(db, link_id, last_accessed_at=LONG_AGO, **fields):
+    link = server.VaultLink(
+        id=link_id, user_id=USER_ID, url="https://drive.google.com/x", name=link_id, created_at=LONG_AGO, **fields
+    ).dict()
+    link["last_accessed_at"] = last_accessed_at
+
+    async def run():
+        await db.vault_links.insert_one(link)
+        await server.rebuild_vault_stats([USER_ID])
+        if link["tags"]:
+            await server.adjust_tag_counts(USER_ID, link["tags"], 1)
+
+    asyncio.run(run())
+
+
+def ids(docs):
+    return sorted(doc["id"] for doc in docs)
+
+
+def test_stale_links_move_to_a_compact_archive(vault_db):
+    seed(vault_db, "stale", tags=["work"])
+    seed(vault_db, "fresh", last_accessed_at=datetime.utcnow())
+
+    async def run():
+        archived = await server.archive_stale_links()
+        return (
+            archived,
+            await vault_db.vault_links.find({}).to_list(10),
+            await vault_db.vault_links_archive.find({}, {"_id": 0}).to_list(10),
+            await server.get_vault_stats(SESSION_TOKEN),
+            await vault_db.tag_counts.count_documents({})
+        )
+
+    archived, hot, cold, stats, tag_counts = asyncio.run(run())
+    assert archived == 1
+    assert ids(hot) == ["fresh"]
+    assert set(cold[0]) == {"id", "user_id", "url", "name", "access_level", "tags", "created_at", "archived_at"}
+    assert (stats.total, stats.archived) == (1, 1)
+    assert stats.recent_activity[0].archived == 1
+    assert tag_counts == 0
+
+
+def test_link_deleted_during_a_run_is_not_archived(vault_db, monkeypatch):
+    seed(vault_db, "stale")
+    seed(vault_db, "deleted")
+    insert_many = type(vault_db.vault_links_archive).insert_many
+
+    async def delete_while_copying(collection, *args, **kwargs):
+        result = await insert_many(collection, *args, **kwargs)
+        await server.delete_vault_link("deleted", SESSION_TOKEN)
+        return result
+
+    monkeypatch.setattr(type(vault_db.vault_links_archive), "insert_many", delete_while_copying)
+
+    async def run():
+        archived = await server.archive_stale_links()
+        return archived, await vault_db.vault_links_archive.find({}).to_list(10), await server.get_vault_stats(SESSION_TOKEN)
+
+    archived, cold, stats = asyncio.run(run())
+    assert archived == 1
+    assert ids(cold) == ["stale"]
+    assert (stats.total, stats.archived) == (0, 1)
+
+
+def test_restore_brings_back_a_full_link(vault_db):
+    seed(vault_db, "stale", tags=["work"])
+
+    async def run():
+        await server.archive_stale_links()
+        restored = await server.restore_vault_link("stale", SESSION_TOKEN)
+        return (
+            restored,
+            await vault_db.vault_links.find_one({"id": "stale"}),
+            await vault_db.vault_links_archive.count_documents({}),
+            await server.get_vault_stats(SESSION_TOKEN),
+            await vault_db.tag_counts.find_one({"tag": "work"})
+        )
+
+    restored, hot, cold, stats, tag_count = asyncio.run(run())
+    assert restored.tags == ["work"]
+    assert hot["folder"] is None and hot["last_accessed_at"] > LONG_AGO
+    assert cold == 0
+    assert (stats.total, stats.archived) == (1, 0)
+    assert stats.recent_activity[0].restored == 1
+    assert tag_count["count"] == 1
+
+
+def test_deleting_an_archived_link(vault_db):
+    seed(vault_db, "stale")
+
+    async def run():
+        await server.archive_stale_links()
+        await server.delete_vault_link("stale", SESSION_TOKEN)
+        return await vault_db.vault_links_archive.count_documents({}), await server.get_vault_stats(SESSION_TOKEN)
+
+    cold, stats = asyncio.run(run())
+    assert cold == 0
+    assert (stats.total, stats.archived) == (0, 0)
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(server.delete_vault_link("stale", SESSION_TOKEN))
+    assert excinfo.value.status_code == 404
+
+
+def test_listing_with_archived_links_keeps_the_limit(vault_db):
+    async def run():
+        for collection in (vault_db.vault_links, vault_db.vault_links_archive):
+            await collection.insert_many([
+                {"id": f"{collection.name}-{i}", "user_id": USER_ID, "url": "https://drive.google.com/x",
+                 "name": "x", "created_at": LONG_AGO + timedelta(minutes=i)}
+                for i in range(600)
+            ])
+        response = await server.get_vault_links(Request(http_scope()), SESSION_TOKEN, include_archived=True)
+        return json.loads(response.body)
+
+    links = asyncio.run(run())
+    assert len(links) == 1000
+    assert links[0]["created_at"] >= links[-1]["created_at"]
@@ -0,0 +1,152 @@
+import asyncio
+
+import server
+from server import ChangeStreamEventBroker, EventBroker
+
+
+def test_reconnect_replays_missed_events():
+    broker = EventBroker()
+    subscription, _ = broker.subscribe("user-1")
+    broker.dispatch("user-1", "link_created", {"id": "a"})
+    broker.dispatch("user-1", "link_created", {"id": "b"})
+    first = subscription.queue.get_nowait()
+    broker.unsubscribe(subscription)
+
+    _, replay = broker.subscribe("user-1", first["id"])
+    assert [event["data"]["id"] for event in replay] == ["b"]
+
+
+def test_position_marker_resumes_without_resync():
+    broker = EventBroker()
+    position = broker.position()
+    broker.dispatch("user-1", "link_deleted", {"id": "a"})
+
+    _, replay = broker.subscribe("user-1", position)
+    assert [event["event"] for event in replay] == ["link_deleted"]
+
+
+def test_unknown_id_resyncs_once():
+    broker = EventBroker()
+    _, replay = broker.subscribe("user-1", "issued-by-another-worker")
+    assert [event["event"] for event in replay] == ["resync"]
+    assert replay[0]["id"] != "issued-by-another-worker"
+
+    # The browser now reconnects with the id it was given and resumes normally
+    broker.dispatch("user-1", "link_created", {"id": "a"})
+    _, replay = broker.subscribe("user-1", replay[0]["id"])
+    assert [event["event"] for event in replay] == ["link_created"]
+
+
+def test_marker_older_than_history_resyncs():
+    broker = EventBroker(history_size=2)
+    position = broker.position()
+    for i in range(3):
+        broker.dispatch("user-1", "link_created", {"id": str(i)})
+
+    _, replay = broker.subscribe("user-1", position)
+    assert [event["event"] for event in replay] == ["resync"]
+
+
+def test_slow_consumer_is_dropped():
+    broker = EventBroker(buffer_size=1)
+    subscription, _ = broker.subscribe("user-1")
+    broker.dispatch("user-1", "link_created", {"id": "a"})
+    broker.dispatch("user-1", "link_created", {"id": "b"})
+
+    assert subscription.queue.get_nowait() is None
+    assert "user-1" not in broker._subscribers
+
+
+def test_listeners_see_every_dispatched_event():
+    broker = EventBroker()
+    seen = []
+    broker.listeners.append(lambda user_id, event: seen.append((user_id, event["event"])))
+    broker.dispatch("user-1", "link_created", {"id": "a"}, event_id="from-another-worker")
+
+    assert seen == [("user-1", "link_created")]
+
+
+def test_resync_all_reaches_every_subscriber_and_invalidates_markers():
+    broker = EventBroker()
+    seen = []
+    broker.listeners.append(lambda user_id, event: seen.append((user_id, event["event"])))
+    first, _ = broker.subscribe("user-1")
+    second, _ = broker.subscribe("user-2")
+    broker.dispatch("user-1", "link_created", {"id": "a"})
+    position = broker.position()
+    first.queue.get_nowait()
+
+    broker.resync_all()
+    assert first.queue.get_nowait()["event"] == "resync"
+    assert second.queue.get_nowait()["event"] == "resync"
+    assert seen[-1] == (None, "resync")
+
+    # Anything issued before the gap can no longer be trusted to resume from
+    _, replay = broker.subscribe("user-1", position)
+    assert [event["event"] for event in replay] == ["resync"]
+
+
+class FakeStream:
+    def __init__(self, changes, error=None):
+        self.changes = changes
+        self.error = error
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for token, change in self.changes:
+            self.resume_token = token
+            yield change
+        if self.error:
+            raise self.error
+        await asyncio.Event().wait()
+
+
+class FakeEventsCollection:
+    def __init__(self, script):
+        self.script = script
+        self.calls = []
+        self.exhausted = asyncio.Event()
+
+    def watch(self, pipeline, resume_after=None):
+        self.calls.append(resume_after)
+        step = self.script.pop(0)
+        if not self.script:
+            self.exhausted.set()
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+
+def test_change_stream_resumes_and_resyncs_when_resume_fails(monkeypatch):
+    real_sleep = asyncio.sleep
+    monkeypatch.setattr(server.asyncio, "sleep", lambda delay: real_sleep(0))
+    change = {"fullDocument": {"_id": "e1", "user_id": "user-1", "event": "link_created", "data": {}}}
+
+    async def scenario():
+        collection = FakeEventsCollection([
+            FakeStream([("token-1", change)], error=ConnectionError("network blip")),
+            RuntimeError("resume point no longer in the oplog"),
+            FakeStream([]),
+        ])
+        broker = ChangeStreamEventBroker(collection)
+        subscription, _ = broker.subscribe("user-1")
+        await broker.start()
+        await asyncio.wait_for(collection.exhausted.wait(), timeout=5)
+        await broker.stop()
+        events = []
+        while not subscription.queue.empty():
+            events.append(subscription.queue.get_nowait()["event"])
+        return collection.calls, events
+
+    calls, events = asyncio.run(scenario())
+    assert calls == [None, "token-1", None]
+    assert events == ["link_created", "resync"]
@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from tests.conftest import SESSION_TOKEN, USER_ID
+
+LINK = server.VaultLinkCreate(url="https://drive.google.com/file/1", name="Budget")
+
+
+def create(key="key-1", link_data=LINK):
+    return server.create_vault_link(link_data, SESSION_TOKEN, idempotency_key=key)
+
+
+def test_replay_returns_the_original_link(vault_db):
+    async def run():
+        first = await create()
+        second = await create()
+        return first, second, await vault_db.vault_links.count_documents({})
+
+    first, second, stored = asyncio.run(run())
+    assert first.id == second.id
+    assert stored == 1
+
+
+def test_replay_after_delete_returns_the_original_link(vault_db):
+    async def run():
+        first = await create()
+        await server.delete_vault_link(first.id, SESSION_TOKEN)
+        return first, await create(), await vault_db.vault_links.count_documents({})
+
+    first, replay, stored = asyncio.run(run())
+    assert replay.id == first.id
+    assert stored == 0
+
+
+def test_different_body_is_rejected(vault_db):
+    other = server.VaultLinkCreate(url="https://drive.google.com/file/2", name="Other")
+
+    async def run():
+        await create()
+        await create(link_data=other)
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 422
+
+
+def claim(vault_db, claimed_at):
+    return vault_db.idempotency_keys.insert_one({
+        "user_id": USER_ID,
+        "key": "key-1",
+        "link_id": "claimed-link",
+        "fingerprint": server.request_fingerprint(LINK),
+        "status": "pending",
+        "claimed_at": claimed_at,
+        "created_at": claimed_at,
+        "expires_at": claimed_at + server.IDEMPOTENCY_KEY_TTL
+    })
+
+
+def test_live_pending_claim_is_in_progress(vault_db):
+    async def run():
+        await claim(vault_db, datetime.utcnow())
+        await create()
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 409
+
+
+def test_abandoned_claim_is_taken_over(vault_db):
+    async def run():
+        await claim(vault_db, datetime.utcnow() - server.IDEMPOTENCY_CLAIM_LEASE - timedelta(seconds=1))
+        link = await create()
+        record = await vault_db.idempotency_keys.find_one({"key": "key-1"})
+        return link, record
+
+    link, record = asyncio.run(run())
+    assert link.id == "claimed-link"
+    assert record["status"] == "completed"
+
+
+def test_abandoned_claim_whose_insert_landed_is_completed(vault_db):
+    async def run():
+        await claim(vault_db, datetime.utcnow() - server.IDEMPOTENCY_CLAIM_LEASE - timedelta(seconds=1))
+        landed = server.new_vault_link(server.User(id=USER_ID, email="", name=""), LINK, link_id="claimed-link")
+        await vault_db.vault_links.insert_one(landed.dict())
+        link = await create()
+        return link, await vault_db.vault_links.count_documents({})
+
+    link, stored = asyncio.run(run())
+    assert link.id == "claimed-link"
+    assert stored == 1
+
+
+def test_claim_survives_bookkeeping_failure(vault_db, monkeypatch):
+    announce = server.announce_vault_link
+    failures = [RuntimeError("stats unavailable")]
+
+    async def flaky_announce(user, vault_link):
+        if failures:
+            raise failures.pop()
+        await announce(user, vault_link)
+
+    monkeypatch.setattr(server, "announce_vault_link", flaky_announce)
+
+    async def run():
+        with pytest.raises(RuntimeError):
+            await create()
+        retry = await create()
+        return retry, await vault_db.vault_links.count_documents({})
+
+    retry, stored = asyncio.run(run())
+    # The link was stored before bookkeeping failed, so the retry must not insert it again
+    assert stored == 1
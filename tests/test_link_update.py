@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from tests.conftest import SESSION_TOKEN
+
+
+def tag_counts(db):
+    async def run():
+        docs = await db.tag_counts.find({}).to_list(100)
+        return {doc["tag"]: doc["count"] for doc in docs}
+    return asyncio.run(run())
+
+
+def create(tags, folder=None):
+    link_data = server.VaultLinkCreate(url="https://drive.google.com/x", name="x", tags=tags, folder=folder)
+    return asyncio.run(server.create_vault_link(link_data, SESSION_TOKEN, idempotency_key=None))
+
+
+def test_changing_tags_moves_tag_counts(vault_db):
+    link = create(["work", "drive"])
+    create(["work"])
+
+    updated = asyncio.run(server.update_vault_link(
+        link.id, server.VaultLinkUpdate(tags=["drive", "Personal"]), SESSION_TOKEN
+    ))
+
+    assert updated.tags == ["drive", "personal"]
+    assert tag_counts(vault_db) == {"work": 1, "drive": 1, "personal": 1}
+
+
+def test_folder_only_update_keeps_tags(vault_db):
+    link = create(["work"], folder="Projects")
+
+    updated = asyncio.run(server.update_vault_link(link.id, server.VaultLinkUpdate(folder=""), SESSION_TOKEN))
+
+    assert updated.folder is None
+    assert updated.tags == ["work"]
+    assert tag_counts(vault_db) == {"work": 1}
+
+
+def test_update_publishes_the_new_link(vault_db):
+    link = create(["work"])
+    subscription, _ = server.vault_events.subscribe(link.user_id)
+    try:
+        asyncio.run(server.update_vault_link(link.id, server.VaultLinkUpdate(tags=[]), SESSION_TOKEN))
+        event = subscription.queue.get_nowait()
+    finally:
+        server.vault_events.unsubscribe(subscription)
+
+    assert event["event"] == "link_updated"
+    assert event["data"]["tags"] == []
+    assert tag_counts(vault_db) == {}
+
+
+def test_updating_a_missing_link_is_404(vault_db):
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(server.update_vault_link("missing", server.VaultLinkUpdate(tags=["x"]), SESSION_TOKEN))
+    assert excinfo.value.status_code == 404
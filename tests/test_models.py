@@ -0,0 +1,33 @@
+import pytest
+from pydantic import ValidationError
+
+from server import MAX_FOLDER_LENGTH, MAX_TAG_LENGTH, MAX_TAGS_PER_LINK, VaultLinkCreate, VaultLinkUpdate
+
+
+def test_tags_are_normalized_on_create():
+    link = VaultLinkCreate(url="https://drive.google.com/x", name="x", tags=[" Work", "work", "", "Drive"], folder="  ")
+    assert link.tags == ["work", "drive"]
+    assert link.folder is None
+
+
+def test_too_many_tags_are_rejected_on_create():
+    with pytest.raises(ValidationError):
+        VaultLinkCreate(
+            url="https://drive.google.com/x",
+            name="x",
+            tags=[f"tag-{i}" for i in range(MAX_TAGS_PER_LINK + 1)],
+        )
+
+
+def test_long_tags_and_folders_are_rejected():
+    with pytest.raises(ValidationError):
+        VaultLinkCreate(url="https://drive.google.com/x", name="x", tags=["t" * (MAX_TAG_LENGTH + 1)])
+    with pytest.raises(ValidationError):
+        VaultLinkCreate(url="https://drive.google.com/x", name="x", folder="f" * (MAX_FOLDER_LENGTH + 1))
+    with pytest.raises(ValidationError):
+        VaultLinkUpdate(tags=["t" * (MAX_TAG_LENGTH + 1)])
+
+
+def test_update_only_sets_given_fields():
+    assert VaultLinkUpdate(tags=["Work"]).dict(exclude_unset=True) == {"tags": ["work"]}
+    assert VaultLinkUpdate(folder=" ").dict(exclude_unset=True) == {"folder": None}
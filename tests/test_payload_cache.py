@@ -0,0 +1,60 @@
+from server import PayloadCache
+
+
+def test_put_after_invalidation_is_not_cached():
+    cache = PayloadCache()
+    generation = cache.generation("user-1")
+    # A write lands while the list query is still running
+    cache.invalidate("user-1")
+    payload = cache.put("user-1", b"stale", generation=generation)
+
+    assert payload.body == b"stale"
+    assert cache.get("user-1") is None
+
+
+def test_put_with_current_generation_is_cached():
+    cache = PayloadCache()
+    cache.invalidate("user-1")
+    generation = cache.generation("user-1")
+    cache.put("user-1", b"fresh", generation=generation)
+
+    assert cache.get("user-1").body == b"fresh"
+
+
+def test_evicted_invalidation_records_stay_conservative():
+    cache = PayloadCache(max_entries=2)
+    generation = cache.generation("user-1")
+    cache.invalidate("user-1")
+    cache.invalidate("user-2")
+    cache.invalidate("user-3")  # evicts user-1's record
+
+    cache.put("user-1", b"stale", generation=generation)
+    assert cache.get("user-1") is None
+
+
+def test_invalidate_drops_every_variant():
+    cache = PayloadCache()
+    cache.put("user-1", b"all")
+    cache.put("user-1", b"tagged", variant=("work", None, False))
+    cache.invalidate("user-1")
+
+    assert cache.get("user-1") is None
+    assert cache.get("user-1", ("work", None, False)) is None
+
+
+def test_max_entries_bounds_variants_of_one_user():
+    cache = PayloadCache(max_entries=3)
+    for i in range(10):
+        cache.put("user-1", b"view", variant=(f"tag-{i}", None, False))
+
+    assert len(cache._entries) == 3
+    assert cache._variants["user-1"] == {(f"tag-{i}", None, False) for i in range(7, 10)}
+    assert cache.get("user-1", ("tag-0", None, False)) is None
+
+
+def test_broker_fan_out_invalidates_the_list_cache():
+    from server import vault_events, vault_link_list_cache
+
+    vault_link_list_cache.put("user-fanout", b"[]")
+    vault_events.dispatch("user-fanout", "link_created", {"id": "a"}, event_id="remote-1")
+    assert vault_link_list_cache.get("user-fanout") is None
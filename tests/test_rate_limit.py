@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from server import InMemoryRateLimitBackend, RateLimitBackend, RateLimitMiddleware
+from tests.asgi import call, http_scope, ok_app
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_bucket_allows_burst_then_refills():
+    clock = FakeClock()
+    backend = InMemoryRateLimitBackend(clock=clock)
+
+    async def run():
+        allowed = [await backend.consume("k", rate=2.0, burst=3) for _ in range(3)]
+        rejected = await backend.consume("k", rate=2.0, burst=3)
+        clock.now += 0.5
+        refilled = await backend.consume("k", rate=2.0, burst=3)
+        return allowed, rejected, refilled
+
+    allowed, rejected, refilled = asyncio.run(run())
+    assert allowed == [0.0, 0.0, 0.0]
+    assert rejected == pytest.approx(0.5)
+    assert refilled == 0.0
+
+
+def test_buckets_are_independent_and_evicted_lru():
+    backend = InMemoryRateLimitBackend(max_keys=2, clock=FakeClock())
+
+    async def run():
+        assert await backend.consume("a", rate=1.0, burst=1) == 0.0
+        assert await backend.consume("a", rate=1.0, burst=1) > 0
+        assert await backend.consume("b", rate=1.0, burst=1) == 0.0
+        assert await backend.consume("c", rate=1.0, burst=1) == 0.0
+        # "a" was least recently used and has been evicted, so it starts full again
+        return await backend.consume("a", rate=1.0, burst=1)
+
+    assert asyncio.run(run()) == 0.0
+
+
+def test_backend_is_abstract():
+    with pytest.raises(TypeError):
+        RateLimitBackend()
+
+
+@pytest.mark.parametrize("rate, burst", [(0, 20), (-1, 20), (5, 0)])
+def test_invalid_config_is_rejected(rate, burst):
+    with pytest.raises(ValueError):
+        RateLimitMiddleware(ok_app, rate=rate, burst=burst)
+
+
+def test_unverified_tokens_share_the_address_bucket():
+    lookups = []
+
+    async def resolver(token):
+        lookups.append(token)
+        return None
+
+    middleware = RateLimitMiddleware(ok_app, rate=1.0, burst=2, session_resolver=resolver, clock=FakeClock())
+
+    async def run():
+        return [
+            (await call(middleware, http_scope(query_string=f"session_token=fake{i}".encode())))[0]
+            for i in range(4)
+        ]
+
+    assert asyncio.run(run()) == [200, 200, 429, 429]
+    # Rejected requests never reach the session lookup
+    assert lookups == ["fake0", "fake1"]
+
+
+def test_verified_session_gets_its_own_bucket():
+    async def resolver(token):
+        return "user-1" if token == "good" else None
+
+    middleware = RateLimitMiddleware(ok_app, rate=1.0, burst=1, session_resolver=resolver, clock=FakeClock())
+
+    async def run():
+        first = await call(middleware, http_scope(query_string=b"session_token=good"))
+        second = await call(middleware, http_scope(query_string=b"session_token=good"))
+        anonymous = await call(middleware, http_scope())
+        return first[0], second[0], anonymous[0]
+
+    # The first request is charged to the address; later ones to the session
+    assert asyncio.run(run()) == (200, 200, 429)
+
+
+def test_trusted_proxy_hops_pick_the_forwarded_client():
+    middleware = RateLimitMiddleware(ok_app, trusted_proxy_hops=1)
+    scope = http_scope(client=("10.0.0.254", 80), headers=[("X-Forwarded-For", "spoofed, 203.0.113.7")])
+    assert middleware.client_address(scope) == "203.0.113.7"
+
+    untrusted = RateLimitMiddleware(ok_app)
+    assert untrusted.client_address(scope) == "10.0.0.254"
+
+
+def test_rejection_carries_retry_after():
+    middleware = RateLimitMiddleware(ok_app, rate=0.5, burst=1, clock=FakeClock())
+
+    async def run():
+        await call(middleware, http_scope())
+        return await call(middleware, http_scope())
+
+    status, headers = asyncio.run(run())
+    assert status == 429
+    assert headers["retry-after"] == "2"
+
+
+def test_session_lookups_are_bounded():
+    active = []
+    peak = []
+
+    async def resolver(token):
+        active.append(token)
+        peak.append(len(active))
+        await asyncio.sleep(0.01)
+        active.remove(token)
+        return None
+
+    middleware = RateLimitMiddleware(ok_app, rate=1.0, burst=100, session_resolver=resolver, max_resolving=2)
+
+    async def run():
+        return await asyncio.gather(*[
+            call(middleware, http_scope(query_string=f"session_token=fake{i}".encode())) for i in range(10)
+        ])
+
+    results = asyncio.run(run())
+    # Requests over the bound skip verification but are still served
+    assert [status for status, _ in results] == [200] * 10
+    assert max(peak) == 2
+    assert len(peak) == 2
@@ -0,0 +1,50 @@
+import asyncio
+
+from server import RequestCoalescer
+
+
+def test_concurrent_callers_share_one_run():
+    calls = []
+
+    async def create():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "link-1"
+
+    async def run():
+        coalescer = RequestCoalescer()
+        return await asyncio.gather(*[coalescer.run("key", create) for _ in range(3)])
+
+    assert asyncio.run(run()) == ["link-1"] * 3
+    assert len(calls) == 1
+
+
+def test_distinct_keys_run_separately():
+    async def run():
+        coalescer = RequestCoalescer()
+
+        async def create(name):
+            await asyncio.sleep(0.01)
+            return name
+
+        return await asyncio.gather(
+            coalescer.run(("user", "key", "fingerprint-a"), lambda: create("a")),
+            coalescer.run(("user", "key", "fingerprint-b"), lambda: create("b")),
+        )
+
+    assert asyncio.run(run()) == ["a", "b"]
+
+
+def test_errors_reach_every_waiter_and_clear_the_key():
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("insert failed")
+
+    async def run():
+        coalescer = RequestCoalescer()
+        results = await asyncio.gather(*[coalescer.run("key", fail) for _ in range(2)], return_exceptions=True)
+        return results, coalescer._inflight
+
+    results, inflight = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert inflight == {}
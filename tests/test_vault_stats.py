@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import server
+from tests.conftest import SESSION_TOKEN, USER_ID
+
+
+def create(access_level="Restricted"):
+    link_data = server.VaultLinkCreate(url="https://drive.google.com/x", name="x", access_level=access_level)
+    return server.create_vault_link(link_data, SESSION_TOKEN, idempotency_key=None)
+
+
+def summary(db):
+    return asyncio.run(db.vault_stats.find_one({"user_id": USER_ID}))
+
+
+def test_adjust_skips_users_without_a_summary(vault_db):
+    asyncio.run(server.adjust_vault_stats(USER_ID, [{"access_level": "Public"}], 1))
+    assert summary(vault_db) is None
+
+
+def test_stats_are_built_lazily_then_kept_incrementally(vault_db):
+    async def run():
+        await vault_db.vault_links.insert_one({"id": "old", "user_id": USER_ID, "access_level": "Public"})
+        first = await server.get_vault_stats(SESSION_TOKEN)
+        link = await create()
+        await create("Public")
+        await server.delete_vault_link(link.id, SESSION_TOKEN)
+        return first, await server.get_vault_stats(SESSION_TOKEN)
+
+    first, stats = asyncio.run(run())
+    assert first.total == 1
+    assert stats.total == 2
+    assert stats.by_access_level == {"Public": 2}
+    assert stats.recent_activity[0].created == 2
+    assert stats.recent_activity[0].deleted == 1
+    assert summary(vault_db)["pending_writes"] == 0
+
+
+def test_rebuild_corrects_drift_without_overwriting(vault_db):
+    async def run():
+        await server.get_vault_stats(SESSION_TOKEN)
+        await create()
+        # Lost increment: the link is stored but the summary never heard of it
+        await vault_db.vault_links.insert_one({"id": "lost", "user_id": USER_ID, "access_level": "Public"})
+        drift = await server.rebuild_vault_stats([USER_ID])
+        return drift, await server.get_vault_stats(SESSION_TOKEN)
+
+    drift, stats = asyncio.run(run())
+    assert [report["user_id"] for report in drift] == [USER_ID]
+    assert stats.total == 2
+    assert stats.by_access_level == {"Restricted": 1, "Public": 1}
+    assert stats.recent_activity[0].created == 1
+
+
+def test_rebuild_waits_for_writes_in_flight(vault_db):
+    async def run():
+        await server.get_vault_stats(SESSION_TOKEN)
+        await server.begin_link_writes([USER_ID])
+        await vault_db.vault_links.insert_one({"id": "landing", "user_id": USER_ID, "access_level": "Public"})
+        drift = await server.rebuild_vault_stats([USER_ID], attempts=1)
+        await server.record_link_changes(USER_ID, [{"access_level": "Public"}], 1)
+        return drift, await server.get_vault_stats(SESSION_TOKEN)
+
+    drift, stats = asyncio.run(run())
+    assert drift == []
+    assert stats.total == 1
+
+
+def test_rebuild_clears_an_abandoned_write(vault_db):
+    async def run():
+        await server.get_vault_stats(SESSION_TOKEN)
+        await server.begin_link_writes([USER_ID])
+        await vault_db.vault_stats.update_one(
+            {"user_id": USER_ID}, {"$set": {"pending_since": datetime.utcnow() - timedelta(hours=1)}}
+        )
+        await vault_db.vault_links.insert_one({"id": "orphan", "user_id": USER_ID, "access_level": "Public"})
+        return await server.rebuild_vault_stats([USER_ID])
+
+    drift = asyncio.run(run())
+    assert drift[0]["expected_total"] == 1
+    assert summary(vault_db)["total"] == 1
+    assert summary(vault_db)["pending_writes"] == 0